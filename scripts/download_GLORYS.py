@@ -1,26 +1,87 @@
 import copernicusmarine
+import numpy as np
+import xarray as xr
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
 copernicusmarine.login()
 
 DATE_TIME_START = datetime(2011, 1, 1)
 DATE_TIME_END = datetime(2013, 12, 31)
+OUTPUT_DIRECTORY = "glorys_3yr_fixed"
 
-current_date = DATE_TIME_START
-while current_date <= DATE_TIME_END:
-    if current_date.month == 12:
-        end_date = datetime(current_date.year + 1, 1, 1)
-        next_date = datetime(current_date.year + 1, 1, 1)
-    else:
-        end_date = datetime(current_date.year, current_date.month + 1, 1)
-        next_date = datetime(current_date.year, current_date.month + 1, 1)
-    
+# Months in flight at once (downloads are network-bound, not CPU-bound)
+MAX_CONCURRENT_MONTHS = 2
+
+# Retry policy: exponential backoff with jitter, capped
+MAX_RETRIES = 5
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+
+
+def month_windows(start, end):
+    """Yield (start, end) datetime pairs, one per calendar month.
+
+    The end is the last day of the month (inclusive), so consecutive
+    requests don't both fetch the 1st of the next month.
+    """
+    current_date = start
+    while current_date <= end:
+        if current_date.month == 12:
+            next_date = datetime(current_date.year + 1, 1, 1)
+        else:
+            next_date = datetime(current_date.year, current_date.month + 1, 1)
+        end_date = next_date - timedelta(days=1)
+        yield current_date, end_date
+        current_date = next_date
+
+
+def month_filename(current_date):
+    return f"glorys_{current_date.strftime('%Y%m')}.nc"
+
+
+def download_month(current_date, end_date):
+    """Subset one month of GLORYS currents to a NetCDF file."""
     # Format with 'T'!
     start_str = current_date.strftime("%Y-%m-%dT%H:%M:%S")
     end_str = end_date.strftime("%Y-%m-%dT%H:%M:%S")
-    
-    print(f"Downloading: {start_str} to {end_str}")
-    
+    output_filename = month_filename(current_date)
+    output_path = os.path.join(OUTPUT_DIRECTORY, output_filename)
+
+    # Download under a temporary name and move it into place only once the
+    # subset succeeded, so a failed attempt never leaves a truncated
+    # glorys_YYYYMM.nc behind. The leading '.' keeps it out of
+    # prepare_GLORYS.py's glorys_*.nc scan.
+    partial_filename = f".partial_{output_filename}"
+    partial_path = os.path.join(OUTPUT_DIRECTORY, partial_filename)
+
+    for attempt in range(MAX_RETRIES):
+        print(f"Downloading: {start_str} to {end_str}")
+
+        # The toolbox won't overwrite: it writes name_(1).nc next to an
+        # existing file. Clear any leftover from a failed attempt first.
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+        try:
+            subset_month(start_str, end_str, partial_filename)
+            os.replace(partial_path, output_path)
+            return output_filename
+        except Exception as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            # Jitter keeps concurrent months from retrying in lockstep
+            wait_time = min(BACKOFF_MAX, BACKOFF_BASE ** (attempt + 1))
+            wait_time += random.uniform(0, wait_time / 2)
+            print(f"  ⚠️ {output_filename} failed ({e}), retrying in {wait_time:.0f}s")
+            time.sleep(wait_time)
+
+
+def subset_month(start_str, end_str, output_filename):
+    """Single copernicusmarine subset request for one month."""
     copernicusmarine.subset(
         dataset_id="cmems_mod_glo_phy_my_0.083deg_P1D-m",
         variables=["vo", "mlotst", "uo"],
@@ -32,11 +93,54 @@ while current_date <= DATE_TIME_END:
         end_datetime=end_str,      # Now with 'T'!
         minimum_depth=0.49402499198913574,
         maximum_depth=541.0889282226562,
-        output_directory="glorys_3yr_fixed",
-        output_filename=f"glorys_{current_date.strftime('%Y%m')}.nc"
+        output_directory=OUTPUT_DIRECTORY,
+        output_filename=output_filename
     )
 
-    print(f"Saved: glorys_{current_date.strftime('%Y%m')}.nc")
-    current_date = next_date
 
-print("All downloads finished successfully!")
\ No newline at end of file
+def is_complete_month(path, start, end):
+    """True if path opens as NetCDF and its time axis covers start..end.
+
+    Only a decode failure from the NetCDF library counts as incomplete.
+    Environment problems (no backend installed, file locked or unreadable)
+    propagate rather than condemn a possibly good file.
+    """
+    try:
+        with xr.open_dataset(path) as ds:
+            times = ds.time.values
+    except (PermissionError, FileNotFoundError):
+        raise
+    except (OSError, RuntimeError):
+        # netCDF4/h5py report truncated or corrupt files this way
+        return False
+    return (len(times) > 0
+            and times.min() <= np.datetime64(start)
+            and times.max() >= np.datetime64(end))
+
+
+# Months already on disk from a previous run need no request at all.
+# Downloads only reach their final name once complete, but files left by
+# older runs may be truncated, so check they open and span the month.
+# Suspect files are moved aside to .stale_<name>, never deleted.
+pending = []
+for start, end in month_windows(DATE_TIME_START, DATE_TIME_END):
+    filename = month_filename(start)
+    existing = os.path.join(OUTPUT_DIRECTORY, filename)
+    if os.path.exists(existing):
+        if is_complete_month(existing, start, end):
+            print(f"Skipping: {filename} already downloaded")
+            continue
+        stale = os.path.join(OUTPUT_DIRECTORY, f".stale_{filename}")
+        print(f"  ⚠️ {filename} is incomplete, moved to {stale}, downloading again")
+        os.replace(existing, stale)
+    pending.append((start, end))
+
+with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_MONTHS) as executor:
+    futures = [
+        executor.submit(download_month, start, end)
+        for start, end in pending
+    ]
+    for future in as_completed(futures):
+        print(f"Saved: {future.result()}")
+
+print("All downloads finished successfully!")
@@ -8,8 +8,10 @@ import xarray as xr
 import numpy as np
 import struct
 import json
+import os
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # ===== CONFIGURATION =====
 input_dir = Path("D:/PROTEUS/data/glorys_3yr_fixed")
@@ -18,157 +20,234 @@ output_dir.mkdir(exist_ok=True)
 
 BASE_DATE = datetime(2011, 1, 1)
 
-# ===== MAIN CONVERSION =====
-print("\n" + "="*70)
-print("🌊 GLORYS Advection Converter + Metadata")
-print("="*70)
+# Each worker holds one day's full 3-D cube, so cap it below the core count
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+WRITE_BUFFER_SIZE = 1 << 20  # 1 MiB
+VERBOSE = False  # per-day progress lines (per-month summaries always print)
+
+# Daily binary header: version, n_lat, n_lon, n_depth, year, month, day
+GLORYS_HEADER = struct.Struct('7i')
+
+
+# ===== FILE DISCOVERY =====
 
-# Find all monthly NetCDF files
-nc_files = sorted(input_dir.glob("glorys_*.nc"))
-print(f"Found {len(nc_files)} monthly files to process")
+def find_monthly_files(directory):
+    """Sorted glorys_YYYYMM.nc paths, from a single directory scan."""
+    with os.scandir(directory) as entries:
+        return sorted(
+            Path(entry.path) for entry in entries
+            if entry.name.startswith('glorys_') and entry.name.endswith('.nc')
+            and entry.is_file()
+        )
 
-all_days = []
-total_processed = 0
-total_skipped = 0
 
-# Loop through each file
-for nc_file in nc_files:
+# ===== PER-MONTH CONVERSION =====
+
+def day_entry(year, month, day_num, filename):
+    """Metadata record for one daily binary (derived from its date alone)."""
+    file_date = datetime(year, month, day_num)
+    return {
+        'year': year,
+        'month': month,
+        'day': day_num,
+        'date_str': f"{year}-{month:02d}-{day_num:02d}",
+        'day_offset': (file_date - BASE_DATE).days,
+        'file': filename
+    }
+
+
+def process_month(nc_file, existing):
+    """
+    Convert every day of one monthly NetCDF file to daily binaries.
+    `existing` is the set of filenames already in output_dir.
+    """
     print(f"\n{'='*50}")
     print(f"Processing: {nc_file.name}")
-    
+
     # Open dataset
     ds = xr.open_dataset(nc_file)
-    
+
     # Get expected month from filename
     expected_year = int(nc_file.stem.split('_')[1][:4])
     expected_month = int(nc_file.stem.split('_')[1][4:6])
-    
+
+    # Time axis read once; per-day data is pulled with isel below so only
+    # that day's slab is read from disk
+    times = ds.time.values
+
     print(f"  Expected: {expected_year}-{expected_month:02d}")
-    print(f"  Actual dates: {ds.time.values[0]} to {ds.time.values[-1]}")
-    print(f"  Days in file: {len(ds.time)}")
-    
+    print(f"  Actual dates: {times[0]} to {times[-1]}")
+    print(f"  Days in file: {len(times)}")
+
     # Get coordinates (same for all days)
     lons = ds.longitude.values
     lats = ds.latitude.values
     depths = ds.depth.values
-    lon_2d, lat_2d = np.meshgrid(lons, lats)
-    
+    # Built as float32 once, so each day's write needs no cast/copy
+    lon_2d, lat_2d = np.meshgrid(lons.astype(np.float32, copy=False),
+                                 lats.astype(np.float32, copy=False))
+    n_depth, n_lat, n_lon = len(depths), len(lats), len(lons)
+
+    # Header + coordinates are the same for every day of the month apart
+    # from the date fields: build the block once, patch the date per day
+    # and write it with a single call
+    prefix = bytearray(GLORYS_HEADER.size) + lon_2d.tobytes() + lat_2d.tobytes()
+    del lon_2d, lat_2d
+
+    days = []
     days_processed = 0
     days_skipped = 0
-    
+
     # Loop through each day
-    for day_idx in range(len(ds.time)):
-        day = ds.time.isel(time=day_idx).values
-        
+    for day_idx, day in enumerate(times):
         # Convert numpy datetime64 to string for filename
         day_str = str(day)[:10].replace('-', '')
-        
-        day_year = int(day_str[:4])
-        day_month = int(day_str[4:6])
-        if day_year != expected_year or day_month != expected_month:
+
+        year = int(day_str[:4])
+        month = int(day_str[4:6])
+        day_num = int(day_str[6:8])
+        if year != expected_year or month != expected_month:
+            days_skipped += 1
+            continue
+
+        # Skip if already exists (before reading any data for the day).
+        # Still list it, so metadata written on a resumed run is complete.
+        output_name = f"glorys_{day_str}.bin"
+        if output_name in existing:
+            if VERBOSE:
+                print(f"  ⏭️  {day_str} already exists, skipping")
+            days.append(day_entry(year, month, day_num, output_name))
             days_skipped += 1
             continue
-        
+
         # Extract data for this day
         u_daily = ds.uo.isel(time=day_idx).values.astype('float16')
         v_daily = ds.vo.isel(time=day_idx).values.astype('float16')
         mlotst_daily = ds.mlotst.isel(time=day_idx).values.astype('float16')
-        
-        # Replace NaN with 0
-        u_daily = np.where(np.isnan(u_daily), 0, u_daily)
-        v_daily = np.where(np.isnan(v_daily), 0, v_daily)
-        mlotst_daily = np.where(np.isnan(mlotst_daily), 0, mlotst_daily)
-        
-        # Get dimensions
-        n_depth, n_lat, n_lon = u_daily.shape
-        
+
+        # Replace NaN with 0 (in place, no new full-size arrays)
+        for field in (u_daily, v_daily, mlotst_daily):
+            np.copyto(field, 0, where=np.isnan(field))
+
         # Write daily file
-        output_file = output_dir / f"glorys_{day_str}.bin"
-        
-        # Skip if already exists
-        if output_file.exists():
-            print(f"  ⏭️  {day_str} already exists, skipping")
-            days_skipped += 1
-            continue
-        
-        with open(output_file, 'wb') as f:
+        output_file = output_dir / output_name
+
+        with open(output_file, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
             # Header
-            year = int(day_str[:4])
-            month = int(day_str[4:6])
-            day_num = int(day_str[6:8])
-            header = struct.pack('7i', 2, n_lat, n_lon, n_depth, year, month, day_num)
-            f.write(header)
-            
-            # Coordinates
-            f.write(lon_2d.astype('float32').tobytes())
-            f.write(lat_2d.astype('float32').tobytes())
-            
+            GLORYS_HEADER.pack_into(prefix, 0, 2, n_lat, n_lon, n_depth, year, month, day_num)
+
+            # Header + coordinates
+            f.write(prefix)
+
             # Data
-            f.write(u_daily.tobytes())
-            f.write(v_daily.tobytes())
-            f.write(mlotst_daily.tobytes())
-        
-        print(f"  ✅ Saved: glorys_{day_str}.bin")
+            u_daily.tofile(f)
+            v_daily.tofile(f)
+            mlotst_daily.tofile(f)
+
+        if VERBOSE:
+            print(f"  ✅ Saved: {output_name}")
         days_processed += 1
-        
+
         # Add to metadata list
-        file_date = datetime(year, month, day_num)
-        day_offset = (file_date - BASE_DATE).days
-        all_days.append({
-            'year': year,
-            'month': month,
-            'day': day_num,
-            'date_str': f"{year}-{month:02d}-{day_num:02d}",
-            'day_offset': day_offset,
-            'file': f"glorys_{day_str}.bin"
-        })
-    
-    print(f"  📊 Summary: {days_processed} processed, {days_skipped} skipped")
-    total_processed += days_processed
-    total_skipped += days_skipped
+        days.append(day_entry(year, month, day_num, output_name))
+
     ds.close()
 
-# ===== SAVE METADATA =====
-print("\n" + "="*70)
-print("📝 Saving metadata...")
-print("="*70)
-
-# Get grid info from first processed file (or use constants)
-if all_days:
-    # Use constants from your grid
-    metadata = {
-        'description': 'GLORYS daily currents at multiple depths (binary format)',
-        'binary_version': 2,  # float16
-        'base_date': BASE_DATE.isoformat(),
+    return {
+        'file': nc_file.name,
+        'days': days,
+        'processed': days_processed,
+        'skipped': days_skipped,
         'depths': depths.tolist(),
-        'depth_count': len(depths),
-        'grid': {
-            'n_lat': n_lat,
-            'n_lon': n_lon,
-            'n_depth': len(depths),
-            'lon_range': [float(lons.min()), float(lons.max())],
-            'lat_range': [float(lats.min()), float(lats.max())]
-        },
-        'days': all_days,
-        'total_days': len(all_days),
-        'date_range': {
-            'start': all_days[0]['date_str'] if all_days else None,
-            'end': all_days[-1]['date_str'] if all_days else None
-        },
-        'stats': {
-            'total_processed': total_processed,
-            'total_skipped': total_skipped
-        }
+        'n_lat': len(lats),
+        'n_lon': len(lons),
+        'lon_range': [float(lons.min()), float(lons.max())],
+        'lat_range': [float(lats.min()), float(lats.max())]
     }
 
-    metadata_path = output_dir / 'glorys_metadata.json'
-    with open(metadata_path, 'w') as f:
-        json.dump(metadata, f, indent=2)
-    
-    print(f"✅ Metadata saved: {metadata_path}")
-    print(f"   {len(all_days)} days processed")
-    print(f"   Depths: {len(depths)} levels")
-
-print("\n" + "="*70)
-print("🎉 All files processed successfully!")
-print("="*70)
\ No newline at end of file
+
+# ===== MAIN CONVERSION =====
+
+def main():
+    print("\n" + "="*70)
+    print("🌊 GLORYS Advection Converter + Metadata")
+    print("="*70)
+
+    # Find all monthly NetCDF files
+    nc_files = find_monthly_files(input_dir)
+    print(f"Found {len(nc_files)} monthly files to process")
+
+    # One scan of the output directory instead of an exists() per day
+    with os.scandir(output_dir) as entries:
+        existing = {entry.name for entry in entries}
+
+    all_days = []
+    total_processed = 0
+    total_skipped = 0
+    grid = None
+
+    # Months are independent: convert them in parallel
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [executor.submit(process_month, nc_file, existing) for nc_file in nc_files]
+
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"  📊 {result['file']}: {result['processed']} processed, "
+                  f"{result['skipped']} skipped")
+
+            all_days.extend(result['days'])
+            total_processed += result['processed']
+            total_skipped += result['skipped']
+            grid = result
+
+    # Months finish out of order
+    all_days.sort(key=lambda d: d['day_offset'])
+
+    # ===== SAVE METADATA =====
+    print("\n" + "="*70)
+    print("📝 Saving metadata...")
+    print("="*70)
+
+    if all_days:
+        depths = grid['depths']
+        metadata = {
+            'description': 'GLORYS daily currents at multiple depths (binary format)',
+            'binary_version': 2,  # float16
+            'base_date': BASE_DATE.isoformat(),
+            'depths': depths,
+            'depth_count': len(depths),
+            'grid': {
+                'n_lat': grid['n_lat'],
+                'n_lon': grid['n_lon'],
+                'n_depth': len(depths),
+                'lon_range': grid['lon_range'],
+                'lat_range': grid['lat_range']
+            },
+            'days': all_days,
+            'total_days': len(all_days),
+            'date_range': {
+                'start': all_days[0]['date_str'] if all_days else None,
+                'end': all_days[-1]['date_str'] if all_days else None
+            },
+            'stats': {
+                'total_processed': total_processed,
+                'total_skipped': total_skipped
+            }
+        }
+
+        metadata_path = output_dir / 'glorys_metadata.json'
+        with open(metadata_path, 'w') as f:
+            # Machine-read by web/glorysLoader.js: no pretty-printing
+            f.write(json.dumps(metadata, separators=(',', ':')))
+
+        print(f"✅ Metadata saved: {metadata_path}")
+        print(f"   {len(all_days)} days processed")
+        print(f"   Depths: {len(depths)} levels")
+
+    print("\n" + "="*70)
+    print("🎉 All files processed successfully!")
+    print("="*70)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,29 +10,83 @@ Following Klocker et al. 2012:
 import numpy as np
 import struct
 import json
+import os
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import gc
 
 # ===== CONFIGURATION =====
 GLORYS_DIR = Path("D:/PROTEUS/data/glorys_3yr_bin")
 EDDY_DIR = Path("D:/PROTEUS/data/eddy_radii_grid_glorys/daily")
 OUTPUT_DIR = Path("D:/PROTEUS/data/k_fields_daily")
+MEANS_FILE = Path("D:/PROTEUS/data/3yr_means.npz")
 OUTPUT_DIR.mkdir(exist_ok=True)
 
 # Klocker parameters
 MIXING_EFFICIENCY = 0.35
 G_OVER_K = 0.03
+SUPPRESSION_SCALE = np.float32(1.0 / G_OVER_K**2)
 
 BASE_DATE = datetime(2011, 1, 1)
+WRITE_BUFFER_SIZE = 1 << 20  # 1 MiB
+VERBOSE_EVERY = 30  # print EKE/K range diagnostics every N days
+
+# Binary headers (prebuilt so the format isn't re-parsed per file)
+GRID_HEADER = struct.Struct('7i')  # version, n_lat, n_lon, n_depth, year, month, day
+EDDY_HEADER = struct.Struct('4i')  # version, year, month, day
 
 
 # ===== FILE READING FUNCTIONS =====
 
+def list_daily_files(directory, prefix):
+    """Sorted <prefix>YYYYMMDD.bin paths, from a single directory scan."""
+    with os.scandir(directory) as entries:
+        return sorted(
+            Path(entry.path) for entry in entries
+            if entry.name.startswith(prefix) and entry.name.endswith('.bin')
+            and entry.is_file()
+        )
+
+
+def read_glorys_shape(filepath):
+    """Read (n_depth, n_lat, n_lon) from a GLORYS daily binary header."""
+    with open(filepath, 'rb') as f:
+        version, n_lat, n_lon, n_depth, year, month, day = \
+            GRID_HEADER.unpack(f.read(GRID_HEADER.size))
+    return n_depth, n_lat, n_lon
+
+
+def means_cache_key(files):
+    """Identify the set of daily files a means cache was built from."""
+    return {
+        'count': len(files),
+        'first_file': files[0].name,
+        'last_file': files[-1].name,
+        'newest_mtime': max(f.stat().st_mtime for f in files)
+    }
+
+
+def means_cache_matches(cache, files):
+    """True if a loaded means cache was built from exactly these files."""
+    if not files:
+        return False
+    key = means_cache_key(files)
+    if any(name not in cache.files for name in key):
+        return False
+    if (int(cache['count']) != key['count']
+            or str(cache['first_file']) != key['first_file']
+            or str(cache['last_file']) != key['last_file']
+            or float(cache['newest_mtime']) != key['newest_mtime']):
+        return False
+    cached_shape = (int(cache['n_depth']), int(cache['n_lat']), int(cache['n_lon']))
+    return cached_shape == read_glorys_shape(files[0])
+
+
 def read_glorys_daily(filepath):
     """Read u, v from GLORYS daily binary (auto-detects version)."""
     with open(filepath, 'rb') as f:
-        header = struct.unpack('7i', f.read(28))
+        header = GRID_HEADER.unpack(f.read(GRID_HEADER.size))
         version, n_lat, n_lon, n_depth, year, month, day = header
         
         # Read coordinates (float32)
@@ -59,7 +113,7 @@ def read_glorys_daily(filepath):
 def read_eddy_daily(filepath):
     """Read radius (L) and phase speed (c_w) from eddy binary."""
     with open(filepath, 'rb') as f:
-        header = struct.unpack('4i', f.read(16))
+        header = EDDY_HEADER.unpack(f.read(EDDY_HEADER.size))
         version, year, month, day = header
         
         data = np.frombuffer(f.read(), dtype=np.float32)
@@ -75,64 +129,104 @@ def read_eddy_daily(filepath):
         return radius, speed, (year, month, day)
 
 
+def read_day_inputs(paths):
+    """Read one day's GLORYS velocities and eddy fields."""
+    glorys_file, eddy_file = paths
+    u, v, _, _, _, _ = read_glorys_daily(glorys_file)
+    radius, speed, _ = read_eddy_daily(eddy_file)
+    return glorys_file, u, v, radius, speed
+
+
+def prefetched(reader, items):
+    """
+    Yield reader(item) for each item, reading the next item on a
+    background thread while the caller works on the current one.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(reader, items[0]) if items else None
+        for i in range(len(items)):
+            result = future.result()
+            if i + 1 < len(items):
+                future = executor.submit(reader, items[i + 1])
+            yield result
+
+
 # ===== PASS 1: Compute 3-year means =====
 print("\n" + "="*70)
 print("📊 PASS 1: Computing 3-year means (2011-2013)...")
 print("="*70)
 
-glorys_files = sorted(GLORYS_DIR.glob("glorys_*.bin"))
+glorys_files = list_daily_files(GLORYS_DIR, 'glorys_')
 print(f"Found {len(glorys_files)} daily files")
 
-# Initialize accumulators for means
-u_sum = None
-v_sum = None
-count = 0
-n_depth, n_lat, n_lon = None, None, None
+# Reuse means from a previous run only if they were built from these
+# exact files (same names, not modified since) on the same grid. Arrays
+# are copied out so the npz is closed before it can be overwritten below.
+cache_hit = False
+if MEANS_FILE.exists():
+    with np.load(MEANS_FILE) as means_cache:
+        if means_cache_matches(means_cache, glorys_files):
+            cache_hit = True
+            u_mean = means_cache['u_mean']
+            v_mean = means_cache['v_mean']
+            n_lat = int(means_cache['n_lat'])
+            n_lon = int(means_cache['n_lon'])
+            n_depth = int(means_cache['n_depth'])
+            count = int(means_cache['count'])
 
-for i, f in enumerate(glorys_files):
-    if i % 100 == 0:
-        print(f"  Processing file {i}/{len(glorys_files)}...")
-    
-    u, v, n_d, n_la, n_lo, _ = read_glorys_daily(f)
-    n_depth, n_lat, n_lon = n_d, n_la, n_lo
-    
-    if u_sum is None:
-        u_sum = np.zeros((n_depth, n_lat, n_lon), dtype=np.float64)
-        v_sum = np.zeros((n_depth, n_lat, n_lon), dtype=np.float64)
-    
-    u_sum += u
-    v_sum += v
-    count += 1
+if cache_hit:
+    print(f"  ✓ Reusing cached means: {MEANS_FILE}")
+else:
+    # Initialize accumulators for means
+    u_sum = None
+    v_sum = None
+    count = 0
+    n_depth, n_lat, n_lon = None, None, None
+
+    for i, (u, v, n_d, n_la, n_lo, _) in enumerate(prefetched(read_glorys_daily, glorys_files)):
+        if i % 100 == 0:
+            print(f"  Processing file {i}/{len(glorys_files)}...")
+        
+        n_depth, n_lat, n_lon = n_d, n_la, n_lo
+        
+        if u_sum is None:
+            u_sum = np.zeros((n_depth, n_lat, n_lon), dtype=np.float64)
+            v_sum = np.zeros((n_depth, n_lat, n_lon), dtype=np.float64)
+        
+        u_sum += u
+        v_sum += v
+        count += 1
+
+    # Compute 3-year means
+    print(f"\n📊 Computing final means from {count} days...")
+    u_mean = (u_sum / count).astype(np.float32)
+    v_mean = (v_sum / count).astype(np.float32)
 
-# Compute 3-year means
-print(f"\n📊 Computing final means from {count} days...")
-u_mean = (u_sum / count).astype(np.float32)
-v_mean = (v_sum / count).astype(np.float32)
+    # Free the large sum arrays
+    del u_sum, v_sum
+    gc.collect()
+
+    # Save means so the next run can skip this pass
+    np.savez(MEANS_FILE,
+             u_mean=u_mean,
+             v_mean=v_mean,
+             n_lat=n_lat,
+             n_lon=n_lon,
+             n_depth=n_depth,
+             **means_cache_key(glorys_files))
 
 # Compute mean flow speed U
 U_mean = np.sqrt(u_mean**2 + v_mean**2)
 
-# Free the large sum arrays
-del u_sum, v_sum
-gc.collect()
-
 print(f"  ✓ U range: {U_mean.min():.3f} - {U_mean.max():.3f} m/s")
 
-# Save means for potential reuse
-np.savez("D:/PROTEUS/data/3yr_means.npz",
-         u_mean=u_mean,
-         v_mean=v_mean,
-         n_lat=n_lat,
-         n_lon=n_lon,
-         n_depth=n_depth)
-
 # ===== PASS 2: Compute daily K using daily EKE =====
 print("\n" + "="*70)
 print("⚙️  PASS 2: Computing daily K values with DAILY EKE...")
 print("="*70)
 
 # Create lookup for eddy files
-eddy_files = sorted(EDDY_DIR.glob("eddy_*.bin"))
+eddy_files = list_daily_files(EDDY_DIR, 'eddy_')
 eddy_by_date = {f.stem.split('_')[1]: f for f in eddy_files}
 print(f"Found {len(eddy_files)} eddy files")
 
@@ -140,70 +234,84 @@ days_processed = 0
 total_size = 0
 all_days = []
 
+# Per-day work buffers: the grid is fixed, so allocate once and reuse
+grid_shape = (n_depth, n_lat, n_lon)
+u_prime = np.empty(grid_shape, dtype=np.float32)
+v_prime = np.empty(grid_shape, dtype=np.float32)
+K_daily = np.empty(grid_shape, dtype=np.float32)
+K_float16 = np.empty(grid_shape, dtype=np.float16)
+C_L = np.empty((n_lat, n_lon), dtype=np.float32)
+rel_speed = np.empty((n_lat, n_lon), dtype=np.float32)
+
+# Days with both inputs available
+day_inputs = []
 for glorys_file in glorys_files:
     date_str = glorys_file.stem.split('_')[1]
-    date_obj = datetime.strptime(date_str, "%Y%m%d")
-    
-    print(f"\n📅 {date_str}...")
-    
     if date_str not in eddy_by_date:
-        print(f"  ⚠️ No eddy file, skipping")
+        print(f"📅 {date_str}: ⚠️ No eddy file, skipping")
         continue
+    day_inputs.append((glorys_file, eddy_by_date[date_str]))
+
+# Next day's files are read in the background while today computes
+for glorys_file, u_daily, v_daily, L_flat, c_w_flat in prefetched(read_day_inputs, day_inputs):
+    date_str = glorys_file.stem.split('_')[1]
+    date_obj = datetime.strptime(date_str, "%Y%m%d")
     
-    # Read today's velocities
-    u_daily, v_daily, n_depth, n_lat, n_lon, _ = read_glorys_daily(glorys_file)
-    
-    # ===== DAILY ANOMALIES =====
-    u_prime = u_daily - u_mean
-    v_prime = v_daily - v_mean
+    # ===== DAILY ANOMALIES (float32 throughout) =====
+    np.subtract(u_daily, u_mean, out=u_prime)
+    np.subtract(v_daily, v_mean, out=v_prime)
     
     # ===== DAILY EKE =====
-    eke_daily = 0.5 * (u_prime**2 + v_prime**2)
+    # 0.5 * (u'² + v'²), accumulated in place in the u' buffer
+    np.multiply(u_prime, u_prime, out=u_prime)
+    np.multiply(v_prime, v_prime, out=v_prime)
+    np.add(u_prime, v_prime, out=u_prime)
+    u_prime *= 0.5
+    eke_daily = u_prime
     
-    # Read eddy data for today
-    L_flat, c_w_flat, _ = read_eddy_daily(eddy_by_date[date_str])
+    # Eddy data for today
     L = L_flat.reshape((n_lat, n_lon))
     c_w = c_w_flat.reshape((n_lat, n_lon))
     
-    # Convert L to meters
-    L_m = L * 1000
-    
-    # Precompute grid-scale quantities
-    k = 2 * np.pi / L_m
-    g = G_OVER_K * k
+    # C * L in meters (depth-independent)
+    np.multiply(L, MIXING_EFFICIENCY * 1000, out=C_L)
     
-    # Initialize K array
-    K_daily = np.zeros((n_depth, n_lat, n_lon), dtype=np.float32)
-    
-    # Compute K for each depth
+    # Compute K for each depth (in place, no full-grid temporaries)
     for depth_idx in range(n_depth):
-        # Get U at this depth (3-year mean)
-        U_depth = U_mean[depth_idx]
-        
-        # ===== DAILY EKE at this depth =====
-        eke_depth = eke_daily[depth_idx]
+        K_depth = K_daily[depth_idx]
         
         # Unsuppressed diffusivity: K0 = C * sqrt(2*EKE) * L
-        K0 = MIXING_EFFICIENCY * np.sqrt(2 * eke_depth) * L_m
+        np.multiply(eke_daily[depth_idx], 2, out=K_depth)
+        np.sqrt(K_depth, out=K_depth)
+        K_depth *= C_L
         
-        # Suppression factor
-        rel_speed = np.abs(c_w - U_depth)
-        suppression = 1.0 / (1.0 + (k**2 * rel_speed**2) / (g**2))
+        # Suppression factor: 1 / (1 + k²(c_w - U)² / g²)
+        # with g = G_OVER_K * k, k²/g² reduces to 1 / G_OVER_K².
+        # Where L == 0 this gives K = 0 (K0 is 0) instead of the NaN the
+        # explicit k = 2π/L form produced from inf/inf.
+        np.subtract(c_w, U_mean[depth_idx], out=rel_speed)
+        np.multiply(rel_speed, rel_speed, out=rel_speed)
+        rel_speed *= SUPPRESSION_SCALE
+        rel_speed += 1
         
-        K_daily[depth_idx] = K0 * suppression
+        K_depth /= rel_speed
     
     # Save as float16
     output_file = OUTPUT_DIR / f"k_{date_str}.bin"
-    with open(output_file, 'wb') as f:
-        header = struct.pack('7i', 2, n_lat, n_lon, n_depth,
-                            date_obj.year, date_obj.month, date_obj.day)
+    with open(output_file, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+        header = GRID_HEADER.pack(2, n_lat, n_lon, n_depth,
+                                  date_obj.year, date_obj.month, date_obj.day)
         f.write(header)
-        f.write(K_daily.astype(np.float16).tobytes())
+        np.copyto(K_float16, K_daily, casting='same_kind')
+        K_float16.tofile(f)
     
-    file_size = output_file.stat().st_size / (1024**2)
-    print(f"  ✅ Saved ({file_size:.1f} MB)")
-    print(f"     EKE daily range: {eke_daily.min():.6f} - {eke_daily.max():.6f} m²/s²")
-    print(f"     K range: {K_daily.min():.1f} - {K_daily.max():.1f} m²/s")
+    file_size = output_file.stat().st_size
+    print(f"📅 {date_str}: ✅ Saved ({file_size / (1024**2):.1f} MB)")
+    
+    # Range diagnostics are four full-cube reductions; sample them
+    if days_processed % VERBOSE_EVERY == 0:
+        print(f"     EKE daily range: {eke_daily.min():.6f} - {eke_daily.max():.6f} m²/s²")
+        print(f"     K range: {K_daily.min():.1f} - {K_daily.max():.1f} m²/s")
     
     # Add to metadata
     day_offset = (date_obj - BASE_DATE).days
@@ -217,10 +325,7 @@ for glorys_file in glorys_files:
     })
     
     days_processed += 1
-    total_size += output_file.stat().st_size
-    
-    if days_processed % 10 == 0:
-        gc.collect()
+    total_size += file_size
 
 
 # ===== SAVE METADATA =====
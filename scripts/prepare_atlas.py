@@ -9,8 +9,8 @@ import struct
 import json
 import os
 from datetime import datetime
-import gc
-from scipy.interpolate import NearestNDInterpolator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from scipy.spatial import cKDTree
 import warnings
 import pandas as pd
 
@@ -21,6 +21,13 @@ GLORYS_DIR = "data/glorys_3yr_bin"
 OUTPUT_DIR = "data/eddy_radii_grid_glorys"
 DAILY_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "daily")
 COORDS_FILE = os.path.join(OUTPUT_DIR, "eddy_coords.bin")
+MAX_WORKERS = os.cpu_count()
+WRITE_BUFFER_SIZE = 1 << 20  # 1 MiB
+
+# Binary headers (prebuilt so the format isn't re-parsed per file)
+GLORYS_HEADER = struct.Struct('7i')  # version, n_lat, n_lon, n_depth, year, month, day
+COORDS_HEADER = struct.Struct('3i')  # version, n_lat, n_lon
+EDDY_HEADER = struct.Struct('4i')    # version, year, month, day
 
 os.makedirs(DAILY_OUTPUT_DIR, exist_ok=True)
 
@@ -33,37 +40,52 @@ def load_glorys_grid_from_binary():
     """Load GLORYS grid coordinates from first daily binary file."""
     print("📊 Loading GLORYS grid coordinates from binary...")
 
-    files = sorted([f for f in os.listdir(GLORYS_DIR) if f.endswith('.bin') and 'glorys_' in f])
+    # Filter by name only; names are glorys_YYYYMMDD.bin, so lexicographic
+    # order is date order
+    with os.scandir(GLORYS_DIR) as entries:
+        files = sorted(
+            entry.name for entry in entries
+            if entry.name.startswith('glorys_') and entry.name.endswith('.bin')
+        )
 
-    if not files:
+    # Size-check only the candidates walked: skip empty/truncated files that
+    # can't even hold a header
+    first_name = next(
+        (name for name in files
+         if os.path.getsize(os.path.join(GLORYS_DIR, name)) > GLORYS_HEADER.size),
+        None
+    )
+    if first_name is None:
         raise FileNotFoundError(f"No GLORYS binary files found in {GLORYS_DIR}")
 
-    first_file = os.path.join(GLORYS_DIR, files[0])
-    print(f"  Using: {files[0]}")
+    first_file = os.path.join(GLORYS_DIR, first_name)
+    print(f"  Using: {first_name}")
 
     with open(first_file, 'rb') as f:
-        header = struct.unpack('7i', f.read(28))
-        version, n_lat, n_lon, n_depth, year, month, day = header
+        header = GLORYS_HEADER.unpack(f.read(GLORYS_HEADER.size))
+    version, n_lat, n_lon, n_depth, year, month, day = header
 
-        total_cells = n_lat * n_lon
-        print(f"  ✓ Grid: {n_lat}×{n_lon}")
+    total_cells = n_lat * n_lon
+    print(f"  ✓ Grid: {n_lat}×{n_lon}")
 
-        lon_array = np.frombuffer(f.read(total_cells * 4), dtype=np.float32)
-        lat_array = np.frombuffer(f.read(total_cells * 4), dtype=np.float32)
+    # Map lon+lat straight from the page cache instead of reading them
+    # into a bytes object; the reshaped views keep the mapping alive
+    coords = np.memmap(first_file, dtype=np.float32, mode='r',
+                       offset=GLORYS_HEADER.size, shape=(2 * total_cells,))
 
-        lon_grid = lon_array.reshape((n_lat, n_lon))
-        lat_grid = lat_array.reshape((n_lat, n_lon))
+    lon_grid = coords[:total_cells].reshape((n_lat, n_lon))
+    lat_grid = coords[total_cells:].reshape((n_lat, n_lon))
 
-        print(f"  ✓ Longitude: {lon_grid.min():.2f}° to {lon_grid.max():.2f}°")
-        print(f"  ✓ Latitude: {lat_grid.min():.2f}° to {lat_grid.max():.2f}°")
+    print(f"  ✓ Longitude: {lon_grid.min():.2f}° to {lon_grid.max():.2f}°")
+    print(f"  ✓ Latitude: {lat_grid.min():.2f}° to {lat_grid.max():.2f}°")
 
-        return {
-            'lon_grid': lon_grid,
-            'lat_grid': lat_grid,
-            'n_lat': n_lat,
-            'n_lon': n_lon,
-            'metadata': {'files': files}
-        }
+    return {
+        'lon_grid': lon_grid,
+        'lat_grid': lat_grid,
+        'n_lat': n_lat,
+        'n_lon': n_lon,
+        'metadata': {'files': files}
+    }
 
 
 # ===== COORDINATES FILE =====
@@ -75,11 +97,11 @@ def save_coordinates_file(lon_grid, lat_grid, output_path):
     n_lat, n_lon = lon_grid.shape
     total_cells = n_lat * n_lon
 
-    with open(output_path, 'wb') as f:
-        header = struct.pack('3i', 1, n_lat, n_lon)
+    with open(output_path, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+        header = COORDS_HEADER.pack(1, n_lat, n_lon)
         f.write(header)
-        f.write(lon_grid.astype(np.float32).tobytes())
-        f.write(lat_grid.astype(np.float32).tobytes())
+        lon_grid.astype(np.float32, copy=False).tofile(f)
+        lat_grid.astype(np.float32, copy=False).tofile(f)
 
     file_size = os.path.getsize(output_path)
     print(f"  ✓ Coordinates saved: {n_lat}×{n_lon} grid")
@@ -98,25 +120,25 @@ def save_coordinates_file(lon_grid, lat_grid, output_path):
 
 # ===== INTERPOLATION TO GLORYS GRID =====
 
-def interpolate_eddies_to_grid(day_eddies, grid_lon, grid_lat):
+def build_grid_points(grid_lon, grid_lat):
+    """Flatten the target grid into (lon, lat) query points (built once)."""
+    return np.column_stack([
+        grid_lon.ravel(),
+        grid_lat.ravel()
+    ])
+
+
+def interpolate_eddies_to_grid(lons, lats, radius_m, speed_values, grid_points, grid_shape):
     """
     Interpolate eddy radii AND phase speed directly to target grid.
     """
-    points = np.column_stack([
-        day_eddies.longitude.values,
-        day_eddies.latitude.values
-    ])
+    points = np.column_stack([lons, lats])
     
     # ===== RADIUS (L) =====
-    radius_values = day_eddies.effective_radius.values / 1000  # convert to km
+    radius_values = radius_m / 1000  # convert to km
     
     # ===== PHASE SPEED (c_w) =====
-    # FIXED: Now using the correct variable name!
-    if 'speed_average' in day_eddies:
-        speed_values = day_eddies.speed_average.values
-        print(f"    ✓ Found speed_average, range: {speed_values.min():.3f} to {speed_values.max():.3f} m/s")
-    else:
-        print(f"    ⚠️ speed_average not found, using default 0.1 m/s")
+    if speed_values is None:
         speed_values = np.ones(len(points)) * 0.1
     
     # Handle missing values
@@ -126,20 +148,15 @@ def interpolate_eddies_to_grid(day_eddies, grid_lon, grid_lat):
     if len(points) == 0:
         return None, None
     
-    # Create interpolators
-    interp_r = NearestNDInterpolator(points, radius_values)
-    interp_s = NearestNDInterpolator(points, speed_values)
+    # Both fields share the same eddy positions: build one tree, query once
+    tree = cKDTree(points)
+    _, nearest = tree.query(grid_points)
     
-    grid_points = np.column_stack([
-        grid_lon.ravel(),
-        grid_lat.ravel()
-    ])
+    radius_grid_flat = radius_values[nearest]
+    speed_grid_flat = speed_values[nearest]
     
-    radius_grid_flat = interp_r(grid_points)
-    speed_grid_flat = interp_s(grid_points)
-    
-    radius_grid = radius_grid_flat.reshape(grid_lon.shape)
-    speed_grid = speed_grid_flat.reshape(grid_lon.shape)
+    radius_grid = radius_grid_flat.reshape(grid_shape)
+    speed_grid = speed_grid_flat.reshape(grid_shape)
     
     return radius_grid.astype(np.float32), speed_grid.astype(np.float32)
 # ===== SAVE DAILY FILE =====
@@ -166,32 +183,67 @@ def save_daily_eddy_file(radius_grid, speed_grid, date_obj, coords_info, output_
     if speed_grid.shape != expected_shape:
         raise ValueError(f"Speed shape mismatch: {speed_grid.shape} vs {expected_shape}")
 
-    with open(filepath, 'wb') as f:
+    with open(filepath, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
         # Header: version=2, year, month, day
-        header = struct.pack('4i', 2, year, month, day)
+        header = EDDY_HEADER.pack(2, year, month, day)
         f.write(header)
         
         # Write radius first, then speed
-        f.write(radius_grid.tobytes())
-        f.write(speed_grid.tobytes())
+        radius_grid.tofile(f)
+        speed_grid.tofile(f)
 
     file_size = os.path.getsize(filepath)
-    print(f"    📁 {date_str}: {file_size / 1024 / 1024:.2f}MB")
-    print(f"    📊 Radius range: {radius_grid.min():.1f} to {radius_grid.max():.1f} km")
-    print(f"    📊 Speed range: {speed_grid.min():.3f} to {speed_grid.max():.3f} m/s")
-    print(f"    📊 Speed mean: {speed_grid.mean():.3f} m/s")
+
+    # Reduce each grid once; the same values feed the log and the metadata
+    radius_min, radius_max = float(radius_grid.min()), float(radius_grid.max())
+    speed_min, speed_max = float(speed_grid.min()), float(speed_grid.max())
+
+    print(f"    📁 {date_str}: {file_size / 1024 / 1024:.2f}MB, "
+          f"radius {radius_min:.1f}-{radius_max:.1f} km, "
+          f"speed {speed_min:.3f}-{speed_max:.3f} m/s")
 
     return {
         'date': date_str,
         'file': filename,
         'size': int(file_size),
-        'radius_min': float(radius_grid.min()),
-        'radius_max': float(radius_grid.max()),
-        'speed_min': float(speed_grid.min()),
-        'speed_max': float(speed_grid.max())
+        'radius_min': radius_min,
+        'radius_max': radius_max,
+        'speed_min': speed_min,
+        'speed_max': speed_max
     }
 
 
+# ===== PARALLEL DAY WORKER =====
+
+# Per-process grid state, set once by the pool initializer
+_worker_state = {}
+
+
+def _init_worker(grid_points, grid_shape, coords_info):
+    """Receive the shared grid once per worker instead of once per day."""
+    _worker_state['grid_points'] = grid_points
+    _worker_state['grid_shape'] = grid_shape
+    _worker_state['coords_info'] = coords_info
+
+
+def process_day(day, lons, lats, radius_m, speed_values):
+    """Interpolate and save one day; returns file info or None."""
+    radius_grid, speed_grid = interpolate_eddies_to_grid(
+        lons, lats, radius_m, speed_values,
+        _worker_state['grid_points'],
+        _worker_state['grid_shape']
+    )
+
+    if radius_grid is None or speed_grid is None:
+        print(f"    Interpolation failed for {day}")
+        return None
+
+    # Save daily file (now with both fields)
+    return save_daily_eddy_file(
+        radius_grid, speed_grid, day, _worker_state['coords_info'], DAILY_OUTPUT_DIR
+    )
+
+
 # ===== MAIN =====
 
 def main():
@@ -209,6 +261,10 @@ def main():
         COORDS_FILE
     )
 
+    # Query points are the same every day
+    grid_points = build_grid_points(glorys_grid['lon_grid'], glorys_grid['lat_grid'])
+    grid_shape = glorys_grid['lon_grid'].shape
+
     # Load eddy data
     print(f"\n📂 Loading eddy data from {INPUT_FILE}...")
     ds = xr.open_dataset(INPUT_FILE)
@@ -216,8 +272,21 @@ def main():
     # Print available variables to help debug
     print(f"  Available variables: {list(ds.data_vars)}")
 
+    # Pull the fields we need into memory once instead of filtering the
+    # whole dataset per day
+    times = ds.time.values
+    eddy_lon = ds.longitude.values
+    eddy_lat = ds.latitude.values
+    eddy_radius = ds.effective_radius.values
+    if 'speed_average' in ds:
+        eddy_speed = ds.speed_average.values
+        print(f"  ✓ Found speed_average, range: {np.nanmin(eddy_speed):.3f} to {np.nanmax(eddy_speed):.3f} m/s")
+    else:
+        print(f"  ⚠️ speed_average not found, using default 0.1 m/s")
+        eddy_speed = None
+
     # Get unique days
-    unique_days = np.unique(ds.time.values)
+    unique_days = np.unique(times)
     print(f"Found {len(unique_days)} unique days")
 
     # Initialize metadata
@@ -243,51 +312,55 @@ def main():
         'processing_date': datetime.now().isoformat()
     }
 
-    # Process each day
+    # Process days in parallel (each day is independent)
     total_days = 0
     total_size = 0
 
-    for day_idx, day in enumerate(unique_days):
-        if TEST_MODE and day_idx > 0:
-            print(f"\n[TEST MODE] Stopping after first day")
-            break
-
-        print(f"\n📅 Day {day_idx + 1}/{len(unique_days)}: {day}")
-
-        # Get eddies for this day
-        day_eddies = ds.where(ds.time == day, drop=True)
-
-        if len(day_eddies.obs) == 0:
-            print(f"    No eddies found")
-            continue
-
-        print(f"    {len(day_eddies.obs)} eddy observations")
-
-        # Interpolate directly to GLORYS grid
-        radius_grid, speed_grid = interpolate_eddies_to_grid(
-            day_eddies,
-            glorys_grid['lon_grid'],
-            glorys_grid['lat_grid']
-        )
-
-        if radius_grid is None or speed_grid is None:
-            print(f"    Interpolation failed")
-            continue
-
-        # Save daily file (now with both fields)
-        file_info = save_daily_eddy_file(
-            radius_grid, speed_grid, day, coords_info, DAILY_OUTPUT_DIR
-        )
-
-        metadata['dates'].append(file_info['date'])
-        metadata['files'].append(file_info)
-        total_days += 1
-        total_size += file_info['size']
-
-        # Clean up
-        del day_eddies, radius_grid, speed_grid
-        if day_idx % 10 == 0:
-            gc.collect()
+    with ProcessPoolExecutor(
+        max_workers=MAX_WORKERS,
+        initializer=_init_worker,
+        initargs=(grid_points, grid_shape, coords_info)
+    ) as executor:
+        futures = {}
+
+        for day_idx, day in enumerate(unique_days):
+            if TEST_MODE and day_idx > 0:
+                print(f"\n[TEST MODE] Stopping after first day")
+                break
+
+            # Get eddies for this day
+            day_mask = times == day
+            n_obs = int(day_mask.sum())
+
+            if n_obs == 0:
+                continue
+
+            future = executor.submit(
+                process_day,
+                day,
+                eddy_lon[day_mask],
+                eddy_lat[day_mask],
+                eddy_radius[day_mask],
+                eddy_speed[day_mask] if eddy_speed is not None else None
+            )
+            futures[future] = (day, n_obs)
+
+        # Progress is reported as days complete, not as they are queued
+        for done, future in enumerate(as_completed(futures), 1):
+            day, n_obs = futures[future]
+            print(f"📅 Day {done}/{len(futures)}: {day} ({n_obs} eddy observations)")
+
+            file_info = future.result()
+            if file_info is None:
+                continue
+
+            metadata['files'].append(file_info)
+            total_days += 1
+            total_size += file_info['size']
+
+    # Workers finish out of order
+    metadata['files'].sort(key=lambda info: info['date'])
+    metadata['dates'] = [info['date'] for info in metadata['files']]
 
     # Save metadata
     metadata['total_days'] = total_days